@@ -24,50 +24,62 @@ Ombi API docs: https://requests.cknolla.com/swagger
 import os
 import logging
 import json
+import sqlite3
 import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import lru_cache
 from http import HTTPStatus
+from logging.handlers import MemoryHandler
+from operator import attrgetter
 from shutil import rmtree
-from typing import Any, Generator
+from typing import Any, Callable, Generator
 from datetime import datetime, timedelta
 
+import orjson
 from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
-logging.basicConfig(
-    format="%(asctime)s:%(levelname)s:%(message)s",
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler(
-            os.path.join(
-                "logs",
-                f"plex-purge_{datetime.now().isoformat().replace(':', '-')}.log",
-            ),
-            mode="w",
-        ),
-        logging.StreamHandler(),
-    ],
-)
 logger = logging.getLogger(os.path.basename(__file__).removesuffix(".py"))
 
 
 CONFIG = {}
 NOW = datetime.now()
+# media timestamps are kept as unix seconds, so compare against NOW in seconds too
+NOW_TS = int(NOW.timestamp())
 MAX_RATING = 10.0
-
-
+# worker count for every thread pool and matching connection pool, set by set_config
+CONCURRENCY = 16
+# per-reason counts of screened out media, summarized at the end of the run
+SKIPPED: Counter[str] = Counter()
+# screening thresholds, precomputed from CONFIG by set_config;
+# media added or played after these unix timestamps is kept
+ADDED_CUTOFF = NOW_TS
+PLAYED_CUTOFF = NOW_TS
+MIN_PLAY_COUNT = 0
+RATING_MIN = MAX_RATING
+AUDIENCE_RATING_MIN = MAX_RATING
+# all of the above fused into one check of a library row, built by set_config
+SKIP_REASON: Callable[[dict[str, Any]], str | None]
+
+
+@dataclass(slots=True)
 class Media:
-    def __init__(self):
-        self.added_at: datetime = NOW
-        self.title: str = ""
-        self.sort_title: str = ""
-        self.tmdb_id: int = 0
-        self.radarr_id: int = 0
-        self.audience_rating: float = MAX_RATING
-        self.rating: float = MAX_RATING
-        self.file_path: str = ""
-        self.file_size: int = 0
-        self.play_count: int = 0
-        self.last_played: datetime = NOW
+    added_at: int = NOW_TS
+    title: str = ""
+    rating_key: str = ""
+    sort_title: str = ""
+    tmdb_id: int = 0
+    radarr_id: int = 0
+    audience_rating: float = MAX_RATING
+    rating: float = MAX_RATING
+    file_path: str = ""
+    file_size: int = 0
+    play_count: int = 0
+    last_played: int | None = NOW_TS
 
     def __repr__(self) -> str:
         return f"<Media {self.title}>"
@@ -75,27 +87,87 @@ class Media:
     def __str__(self) -> str:
         return f"{self.title}"
 
-    @property
-    def new(self) -> bool:
-        """Return whether the media was added recently."""
-        return NOW - self.added_at < timedelta(days=CONFIG["min_age_days"])
-
-    @property
-    def recently_watched(self) -> bool:
-        if not self.last_played:
-            return False
-        return NOW - self.last_played < timedelta(days=CONFIG["recently_watched_days"])
-
-    @property
-    def popular(self) -> bool:
-        return self.play_count >= CONFIG["min_play_count"]
-
     @property
     def well_rated(self) -> bool:
-        return (
-            self.rating >= CONFIG["rating_min"]
-            or self.audience_rating >= CONFIG["audience_rating_min"]
-        )
+        return self.rating >= RATING_MIN or self.audience_rating >= AUDIENCE_RATING_MIN
+
+
+def set_config(config: dict[str, Any]) -> None:
+    """Set CONFIG and precompute the settings and thresholds used throughout the run."""
+    global CONFIG, CONCURRENCY, ADDED_CUTOFF, PLAYED_CUTOFF
+    global MIN_PLAY_COUNT, RATING_MIN, AUDIENCE_RATING_MIN, SKIP_REASON
+    CONFIG = config
+    CONCURRENCY = CONFIG.get("concurrency", 16)
+    CONFIG["whitelist"] = frozenset(CONFIG.get("whitelist", []))
+    ADDED_CUTOFF = int((NOW - timedelta(days=CONFIG["min_age_days"])).timestamp())
+    PLAYED_CUTOFF = int(
+        (NOW - timedelta(days=CONFIG["recently_watched_days"])).timestamp()
+    )
+    MIN_PLAY_COUNT = CONFIG["min_play_count"]
+    RATING_MIN = CONFIG["rating_min"]
+    AUDIENCE_RATING_MIN = CONFIG["audience_rating_min"]
+    SKIP_REASON = build_skip_reason()
+
+
+def build_skip_reason() -> Callable[[dict[str, Any]], str | None]:
+    """Build the library row screen with every threshold bound as a local."""
+
+    def skip_reason(
+        media_info: dict[str, Any],
+        whitelist: frozenset[str] = CONFIG["whitelist"],
+        added_cutoff: int = ADDED_CUTOFF,
+        played_cutoff: int = PLAYED_CUTOFF,
+        min_play_count: int = MIN_PLAY_COUNT,
+        rating_min: float = RATING_MIN,
+        audience_rating_min: float = AUDIENCE_RATING_MIN,
+    ) -> str | None:
+        """Return why a library row is skipped, or None if its metadata is needed."""
+        if media_info["title"] in whitelist:
+            return "whitelisted"
+        if int(media_info["added_at"]) > added_cutoff:
+            return "new"
+        if (media_info["play_count"] or 0) >= min_play_count:
+            return "popular"
+        last_played = media_info["last_played"]
+        if last_played and last_played > played_cutoff:
+            return "recently watched"
+        # some Tautulli versions include ratings in library media info, saving a lookup
+        rating = media_info.get("rating")
+        audience_rating = media_info.get("audience_rating")
+        if (rating and float(rating) >= rating_min) or (
+            audience_rating and float(audience_rating) >= audience_rating_min
+        ):
+            return "well-rated"
+        return None
+
+    return skip_reason
+
+
+def build_session(pool_size: int) -> Session:
+    """Build a Session that reuses a connection per worker and backs off on overload."""
+    session = Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        # back off when the server is overloaded, honoring any Retry-After; only
+        # reads are replayed, and the last response is returned for callers to check
+        max_retries=Retry(
+            total=4,
+            backoff_factor=1,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+            status_forcelist=[
+                HTTPStatus.TOO_MANY_REQUESTS,
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                HTTPStatus.BAD_GATEWAY,
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                HTTPStatus.GATEWAY_TIMEOUT,
+            ],
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def get_libraries(session: Session, tautulli_url: str) -> dict[str, str]:
@@ -107,53 +179,87 @@ def get_libraries(session: Session, tautulli_url: str) -> dict[str, str]:
                 "cmd": "refresh_libraries_list",
             },
         )
-        assert refresh_response.json()["response"]["result"] == "success"
+        assert orjson.loads(refresh_response.content)["response"]["result"] == "success"
     get_libraries_response = session.get(
         tautulli_url,
         params={
             "cmd": "get_libraries",
         },
     )
-    get_libraries_data = get_libraries_response.json()["response"]["data"]
+    get_libraries_data = orjson.loads(get_libraries_response.content)["response"][
+        "data"
+    ]
     libraries = {
         library["section_name"]: library["section_id"] for library in get_libraries_data
     }
     return libraries
 
 
+def get_media_info_page(
+    session: Session,
+    tautulli_url: str,
+    section_id: str,
+    offset: int,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """Get a single page of library media info."""
+    logging.debug("Fetching media info")
+    media_info = session.get(
+        tautulli_url,
+        params={
+            "cmd": "get_library_media_info",
+            "section_id": section_id,
+            "start": offset,
+            "length": limit,
+            # refresh cache on first query only
+            "refresh": "true" if offset == 0 else "false",
+        },
+    )
+    return orjson.loads(media_info.content)["response"]["data"]["data"]
+
+
 def get_media_info(
     session: Session,
     tautulli_url: str,
     section_id: str,
+    limit: int = 1000,
 ) -> Generator[dict[str, Any], None, None]:
-    """Get paged library media info."""
+    """Get paged library media info, fetching the next page while this one is used."""
     offset = 0
-    limit = 50
-    while True:
-        logging.debug("Fetching media info")
-        media_info = session.get(
-            tautulli_url,
-            params={
-                "cmd": "get_library_media_info",
-                "section_id": section_id,
-                "start": offset,
-                "length": limit,
-                # refresh cache on first query only
-                "refresh": "true" if offset == 0 else "false",
-            },
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(
+            get_media_info_page,
+            session=session,
+            tautulli_url=tautulli_url,
+            section_id=section_id,
+            offset=offset,
+            limit=limit,
         )
-        media_info_data = media_info.json()["response"]["data"]["data"]
-        if not media_info_data:
-            return
-        for media_info in media_info_data:
-            yield media_info
-        offset += limit
-
-
+        while True:
+            media_info_data = next_page.result()
+            # a short page is the last one, so skip the empty round trip after it
+            last_page = len(media_info_data) < limit
+            if not last_page:
+                offset += limit
+                next_page = executor.submit(
+                    get_media_info_page,
+                    session=session,
+                    tautulli_url=tautulli_url,
+                    section_id=section_id,
+                    offset=offset,
+                    limit=limit,
+                )
+            for media_info in media_info_data:
+                yield media_info
+            if last_page:
+                return
+
+
+@lru_cache(maxsize=4096)
 def get_metadata(
     session: Session, tautulli_url: str, rating_key: str
 ) -> dict[str, Any]:
-    """Get a single item's metadata."""
+    """Get a single item's metadata, reusing it if already fetched this run."""
     logging.debug("Fetching metadata")
     get_metadata_response = session.get(
         tautulli_url,
@@ -162,8 +268,116 @@ def get_metadata(
             "rating_key": rating_key,
         },
     )
-    metadata = get_metadata_response.json()["response"]["data"]
-    return metadata
+    metadata = orjson.loads(get_metadata_response.content)["response"]["data"]
+    if not metadata:
+        return metadata
+    # keep only what screening reads so cached and in-memory copies stay small
+    return {
+        "guids": metadata["guids"],
+        "rating": metadata["rating"],
+        "audience_rating": metadata["audience_rating"],
+        "media_info": [
+            {"parts": [{"file": part["file"]} for part in media_info["parts"]]}
+            for media_info in metadata["media_info"]
+        ],
+    }
+
+
+def screen_media(media_info: dict[str, Any]) -> Media | None:
+    """Build Media from library info, or None if cheap criteria already rule it out."""
+    logger.debug("Examining %s", media_info["title"])
+    skip_reason = SKIP_REASON(media_info)
+    if skip_reason:
+        logger.debug("\tSkipping, %s", skip_reason)
+        SKIPPED[skip_reason] += 1
+        return None
+    return Media(
+        title=media_info["title"],
+        rating_key=media_info["rating_key"],
+        sort_title=media_info["sort_title"],
+        added_at=int(media_info["added_at"]),
+        play_count=media_info["play_count"] or 0,
+        last_played=media_info["last_played"] or None,
+        file_size=int(media_info["file_size"]),
+    )
+
+
+def screen_metadata(media: Media, metadata: dict[str, Any]) -> bool:
+    """Fill in Media from its metadata and return whether it should be blacklisted."""
+    if not metadata:
+        logger.warning(
+            f"\t{media.title} has no metadata which means it was probably deleted. Skipping"
+        )
+        SKIPPED["deleted"] += 1
+        return False
+    tmdb_guid = next(
+        (guid for guid in metadata["guids"] if guid.startswith("tmdb://")), None
+    )
+    if tmdb_guid:
+        media.tmdb_id = int(tmdb_guid.removeprefix("tmdb://"))
+    media.rating = float(metadata["rating"]) if metadata["rating"] else MAX_RATING
+    media.audience_rating = (
+        float(metadata["audience_rating"])
+        if metadata["audience_rating"]
+        else MAX_RATING
+    )
+    if media.well_rated:
+        logger.debug("\t%s is well-rated, skipping", media.title)
+        SKIPPED["well-rated"] += 1
+        return False
+    media.file_path = metadata["media_info"][0]["parts"][0]["file"]
+    logging.warning(f"\t{media.title} has met all the criteria to be blacklisted")
+    return True
+
+
+def get_updated_at(media_info: dict[str, Any]) -> int:
+    """Get when Plex last updated an item so stale cached metadata can be detected."""
+    if media_info.get("updated_at"):
+        return int(media_info["updated_at"])
+    # library media info doesn't include updated_at, but Plex versions thumbs with it
+    thumb_version = (media_info.get("thumb") or "").rpartition("/")[2]
+    if thumb_version.isdigit():
+        return int(thumb_version)
+    return int(media_info["added_at"])
+
+
+def open_metadata_cache(cache_path: str) -> sqlite3.Connection:
+    """Open the on-disk metadata cache, creating it if needed."""
+    if CONFIG.get("nuke_cache") and os.path.exists(cache_path):
+        logger.info(f"Removing metadata cache {cache_path}")
+        os.remove(cache_path)
+    cache = sqlite3.connect(cache_path)
+    cache.execute(
+        "CREATE TABLE IF NOT EXISTS cache"
+        " (rating_key TEXT PRIMARY KEY, updated_at INTEGER, payload BLOB)"
+    )
+    return cache
+
+
+def get_cached_metadata(
+    cache: sqlite3.Connection, rating_key: str, updated_at: int
+) -> dict[str, Any] | None:
+    """Get an item's metadata from the cache if it hasn't been updated since."""
+    row = cache.execute(
+        "SELECT payload FROM cache WHERE rating_key = ? AND updated_at = ?",
+        (rating_key, updated_at),
+    ).fetchone()
+    if row is None:
+        return None
+    return orjson.loads(row[0])
+
+
+def cache_metadata(
+    cache: sqlite3.Connection,
+    rating_key: str,
+    updated_at: int,
+    metadata: dict[str, Any],
+) -> None:
+    """Store an item's metadata in the cache."""
+    cache.execute(
+        "INSERT OR REPLACE INTO cache (rating_key, updated_at, payload) VALUES (?, ?, ?)",
+        (rating_key, updated_at, orjson.dumps(metadata)),
+    )
 
 
 def get_docs(session: Session, tautulli_url: str) -> None:
@@ -177,11 +391,12 @@ def get_docs(session: Session, tautulli_url: str) -> None:
         },
     )
     logging.info(f"Writing Tautulli docs to {docs_filepath}")
-    with open(docs_filepath, "w") as file:
-        json.dump(
-            docs_response.json()["response"]["data"],
-            file,
-            indent=2,
+    with open(docs_filepath, "wb") as file:
+        file.write(
+            orjson.dumps(
+                orjson.loads(docs_response.content)["response"]["data"],
+                option=orjson.OPT_INDENT_2,
+            )
         )
 
 
@@ -190,21 +405,28 @@ def remove_from_ombi(session: Session, ombi_url: str, blacklist: list[Media]):
     in_ombi: list[str] = []
     errors_in_ombi: list[str] = []
     not_in_ombi: list[str] = []
-    requests: list[dict] = session.get(
-        f"{ombi_url}/Request/movie",
-    ).json()
+    requests: list[dict] = orjson.loads(
+        session.get(
+            f"{ombi_url}/Request/movie",
+        ).content
+    )
     keyed_requests = {request["theMovieDbId"]: request["id"] for request in requests}
-    for media in blacklist:
-        if media.tmdb_id not in keyed_requests:
-            not_in_ombi.append(media.title)
-            continue
-        delete_response = session.delete(
-            f"{ombi_url}/Request/movie/{keyed_requests[media.tmdb_id]}"
-        )
-        if delete_response.status_code != HTTPStatus.OK:
-            errors_in_ombi.append(media.title)
-        else:
-            in_ombi.append(media.title)
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        deletes: dict[Future, Media] = {}
+        for media in blacklist:
+            if media.tmdb_id not in keyed_requests:
+                not_in_ombi.append(media.title)
+                continue
+            future = executor.submit(
+                session.delete,
+                f"{ombi_url}/Request/movie/{keyed_requests[media.tmdb_id]}",
+            )
+            deletes[future] = media
+        for future in as_completed(deletes):
+            if future.result().status_code != HTTPStatus.OK:
+                errors_in_ombi.append(deletes[future].title)
+            else:
+                in_ombi.append(deletes[future].title)
     if in_ombi:
         logger.info(f"The following were removed from Ombi: {in_ombi}")
     if errors_in_ombi:
@@ -221,15 +443,15 @@ def remove_from_radarr(
     """Unmonitor movies in Radarr."""
     in_radarr: list[Media] = []
     not_in_radarr: list[Media] = []
-    for media in blacklist:
-        movie_details: dict = session.get(
+    movies: list[dict] = orjson.loads(
+        session.get(
             f"{radarr_url}/movie",
-            params={
-                "tmdbid": media.tmdb_id,
-            },
-        ).json()
-        if len(movie_details) > 0:
-            media.radarr_id = movie_details[0]["id"]
+        ).content
+    )
+    keyed_movies = {movie["tmdbId"]: movie["id"] for movie in movies}
+    for media in blacklist:
+        if media.tmdb_id in keyed_movies:
+            media.radarr_id = keyed_movies[media.tmdb_id]
             in_radarr.append(media)
         else:
             not_in_radarr.append(media)
@@ -251,32 +473,77 @@ def remove_from_radarr(
             },
         )
         if delete_response.status_code != HTTPStatus.OK:
-            logger.error(f"Error deleting from Radarr: {delete_response.json()}")
+            logger.error(f"Error deleting from Radarr: {delete_response.text}")
     return not_in_radarr
 
 
 def direct_delete(medias: list[Media]):
     """If it couldn't be gracefully removed via Radarr, use file system to delete."""
-    for media in medias:
-        if os.path.exists(media.file_path):
-            logger.info(f"Directly deleting {media.title} at {media.file_path}")
-            os.remove(media.file_path)
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        removals: list[Future] = []
+        for media in medias:
+            if os.path.exists(media.file_path):
+                logger.info(f"Directly deleting {media.title} at {media.file_path}")
+                removals.append(executor.submit(os.remove, media.file_path))
+        for removal in removals:
+            # surface any failed removal, same as deleting serially would
+            removal.result()
 
 
 def empty_trash(trash_dirs: list[str]):
     """Delete trash folders on mounted drive."""
     logger.info(f"Removing trash dirs: {trash_dirs}")
+    trash_dirs = [trash_dir for trash_dir in trash_dirs if os.path.exists(trash_dir)]
+    file_paths = [
+        os.path.join(dir_path, file_name)
+        for trash_dir in trash_dirs
+        for dir_path, _, file_names in os.walk(trash_dir)
+        for file_name in file_names
+    ]
+    # unlinks are the slow part on a network mount, so do them concurrently
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        # consume the results so any failed unlink raises
+        list(executor.map(os.unlink, file_paths))
+    # only (now empty) directories are left
     for trash_dir in trash_dirs:
-        if os.path.exists(trash_dir):
-            rmtree(trash_dir)
+        rmtree(trash_dir)
+
+
+def configure_logging() -> None:
+    """Log to a timestamped file in logs/ as well as to the console."""
+    log_format = "%(asctime)s:%(levelname)s:%(message)s"
+    file_handler = logging.FileHandler(
+        os.path.join(
+            "logs",
+            f"plex-purge_{datetime.now().isoformat().replace(':', '-')}.log",
+        ),
+        mode="w",
+        delay=True,
+    )
+    file_handler.setFormatter(logging.Formatter(log_format))
+    # coalesce file writes; errors flush right away and logging.shutdown flushes
+    # the rest when the script exits
+    memory_handler = MemoryHandler(
+        capacity=4096,
+        flushLevel=logging.ERROR,
+        target=file_handler,
+    )
+    logging.basicConfig(
+        format=log_format,
+        level=logging.INFO,
+        handlers=[
+            memory_handler,
+            logging.StreamHandler(),
+        ],
+    )
 
 
 def main() -> None:
-    global CONFIG
+    configure_logging()
     start_time = time.time()
     with open(os.path.join("config.json")) as config_file:
         logger.info("Loading config")
-        CONFIG = json.load(config_file)
+        set_config(json.load(config_file))
     if CONFIG["trash_dirs"]:
         if (
             input(
@@ -293,21 +560,25 @@ def main() -> None:
     radarr_api_key = CONFIG["radarr_api_key"]
     ombi_url = CONFIG["ombi_url"]
     ombi_api_key = CONFIG["ombi_api_key"]
-    tautulli_session = Session()
+    # one connection per metadata worker, plus one for the page prefetch
+    tautulli_session = build_session(pool_size=CONCURRENCY + 1)
     tautulli_session.params = {
         "apikey": tautulli_api_key,
     }
-    radarr_session = Session()
+    # Radarr only gets two sequential requests; its library GET still gets retries
+    radarr_session = build_session(pool_size=1)
     radarr_session.params = {
         "apikey": radarr_api_key,
     }
-    ombi_session = Session()
-    ombi_session.headers = {
-        "ApiKey": ombi_api_key,
-    }
+    ombi_session = build_session(pool_size=CONCURRENCY)
+    # update rather than replace the headers to keep requests' Accept-Encoding
+    ombi_session.headers.update(
+        {
+            "ApiKey": ombi_api_key,
+        }
+    )
     blacklist: list[Media] = []
     total_media_count = 0
-    total_file_size = 0
     if CONFIG["generate_docs"]:
         get_docs(
             session=tautulli_session,
@@ -319,71 +590,78 @@ def main() -> None:
         session=tautulli_session,
         tautulli_url=tautulli_url,
     )
-    for media_info in get_media_info(
-        session=tautulli_session,
-        tautulli_url=tautulli_url,
-        section_id=libraries[CONFIG["library_name"]],
-    ):
-        media = Media()
-        total_media_count += 1
-        media.title = media_info["title"]
-        media.sort_title = media_info["sort_title"]
-        logging.info(f"Examining {media.title}")
-        if media.title in CONFIG["whitelist"]:
-            logging.info("\tIn whitelist, skipping")
-            continue
-        media.added_at = datetime.fromtimestamp(int(media_info["added_at"]))
-        if media.new:
-            logging.info("\tAdded recently, skipping")
-            continue
-        media.play_count = media_info["play_count"] or 0
-        if media.popular:
-            logging.info("\tPopular, skipping")
-            continue
-        media.last_played = (
-            datetime.fromtimestamp(media_info["last_played"])
-            if media_info["last_played"]
-            else None
-        )
-        # if media.recently_watched:
-        #     logging.info("\tRecently watched, skipping")
-        #     continue
-        metadata = get_metadata(
+    metadata_cache = open_metadata_cache(
+        CONFIG.get("metadata_cache_path", "metadata_cache.sqlite")
+    )
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        pending: dict[Future, tuple[Media, int]] = {}
+        seen_rating_keys: set[str] = set()
+        for media_info in get_media_info(
             session=tautulli_session,
             tautulli_url=tautulli_url,
-            rating_key=media_info["rating_key"],
-        )
-        if not metadata:
-            logger.warning(
-                f"\t{media.title} has no metadata which means it was probably deleted. Skipping"
+            section_id=libraries[CONFIG["library_name"]],
+            limit=CONFIG.get("page_size", 1000),
+        ):
+            # rows can repeat across pages if the library changes mid-run;
+            # only screen (and fetch metadata for) each item once
+            if media_info["rating_key"] in seen_rating_keys:
+                continue
+            seen_rating_keys.add(media_info["rating_key"])
+            total_media_count += 1
+            media = screen_media(media_info)
+            if media is None:
+                continue
+            updated_at = get_updated_at(media_info)
+            metadata = get_cached_metadata(
+                cache=metadata_cache,
+                rating_key=media.rating_key,
+                updated_at=updated_at,
             )
-            continue
-        for guid in metadata["guids"]:
-            if guid.startswith("tmdb"):
-                media.tmdb_id = int(guid.removeprefix("tmdb://"))
-        media.rating = float(metadata["rating"]) if metadata["rating"] else MAX_RATING
-        media.audience_rating = (
-            float(metadata["audience_rating"])
-            if metadata["audience_rating"]
-            else MAX_RATING
-        )
-        if media.well_rated:
-            logging.info("\tWell-rated, skipping")
-            continue
-        media.file_path = metadata["media_info"][0]["parts"][0]["file"]
-        media.file_size = int(media_info["file_size"])
-        logging.warning(f"\t{media.title} has met all the criteria to be blacklisted")
-        blacklist.append(media)
-        total_file_size += media.file_size
+            if metadata is not None:
+                if screen_metadata(media, metadata):
+                    blacklist.append(media)
+                continue
+            # only items that survive the cheap screening hit the network for metadata
+            future = executor.submit(
+                get_metadata,
+                session=tautulli_session,
+                tautulli_url=tautulli_url,
+                rating_key=media.rating_key,
+            )
+            pending[future] = (media, updated_at)
+        for future in as_completed(pending):
+            media, updated_at = pending[future]
+            try:
+                metadata = future.result()
+            except Exception as error:
+                # a failed lookup only means this item won't be purged this run
+                logger.error(f"\tError fetching metadata for {media.title}: {error}")
+                continue
+            if metadata:
+                cache_metadata(
+                    cache=metadata_cache,
+                    rating_key=media.rating_key,
+                    updated_at=updated_at,
+                    metadata=metadata,
+                )
+            if screen_metadata(media, metadata):
+                blacklist.append(media)
+    metadata_cache.commit()
+    metadata_cache.close()
+    total_file_size = sum(media.file_size for media in blacklist)
 
     logging.info(
         "Blacklist: "
         + json.dumps(
-            [item.title for item in sorted(blacklist, key=lambda x: x.sort_title)],
+            [item.title for item in sorted(blacklist, key=attrgetter("sort_title"))],
             indent=2,
         )
     )
     logging.info(f"Total media count: {total_media_count}")
+    logging.info(
+        "Skipped: "
+        + ", ".join(f"{count} {reason}" for reason, count in SKIPPED.most_common())
+    )
     logging.info(
         f"Blacklist size: {len(blacklist)}, {(len(blacklist)/total_media_count * 100):.2f}%"
     )
@@ -1,6 +1,30 @@
+import logging
 import os
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
 
-from main import empty_trash
+import orjson
+import pytest
+
+import main
+from main import (
+    Media,
+    build_session,
+    cache_metadata,
+    direct_delete,
+    empty_trash,
+    get_cached_metadata,
+    get_media_info,
+    get_metadata,
+    get_updated_at,
+    open_metadata_cache,
+    remove_from_ombi,
+    remove_from_radarr,
+    screen_media,
+    screen_metadata,
+    set_config,
+)
 
 
 def test_empty_trash():
@@ -26,3 +50,217 @@ def test_empty_trash():
 
     assert not os.path.exists(os.path.join("tests", "trash"))
     assert not os.path.exists(os.path.join("tests", "trash2"))
+
+
+def test_direct_delete(tmp_path):
+    """Test that direct_delete removes every media file that still exists."""
+    medias = []
+    for title in ("Cats", "Morbius"):
+        file_path = tmp_path / f"{title}.mkv"
+        file_path.write_text("video")
+        medias.append(Media(title=title, file_path=str(file_path)))
+    medias.append(Media(title="Gigli", file_path=str(tmp_path / "Gigli.mkv")))
+
+    direct_delete(medias)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_screen_media():
+    """Test that screen_media only lets through media that needs a metadata lookup."""
+    set_config(
+        {
+            "whitelist": ["Zootopia"],
+            "min_age_days": 182,
+            "recently_watched_days": 90,
+            "min_play_count": 2,
+            "rating_min": 7.0,
+            "audience_rating_min": 7.0,
+        }
+    )
+    media_info = {
+        "title": "Cats",
+        "rating_key": "1234",
+        "sort_title": "Cats",
+        "added_at": "1471813628",
+        "play_count": None,
+        "last_played": None,
+        "file_size": "6273349739",
+    }
+
+    media = screen_media(media_info)
+
+    assert media is not None
+    assert media.title == "Cats"
+    assert media.play_count == 0
+    assert screen_media({**media_info, "title": "Zootopia"}) is None
+    assert screen_media({**media_info, "play_count": 16}) is None
+    assert (
+        screen_media({**media_info, "added_at": str(int(main.NOW.timestamp()))}) is None
+    )
+    assert (
+        screen_media({**media_info, "last_played": int(main.NOW.timestamp())}) is None
+    )
+    assert screen_media({**media_info, "audience_rating": "9.2"}) is None
+    assert screen_media({**media_info, "rating": "4.1"}) is not None
+
+
+def test_screen_metadata():
+    """Test that screen_metadata fills in Media and blacklists poorly rated media."""
+    set_config(
+        {
+            "whitelist": [],
+            "min_age_days": 182,
+            "recently_watched_days": 90,
+            "min_play_count": 2,
+            "rating_min": 7.0,
+            "audience_rating_min": 7.0,
+        }
+    )
+    metadata = {
+        "guids": ["imdb://tt2948356", "tmdb://269149", "tvdb://2446"],
+        "rating": "4.1",
+        "audience_rating": "5.0",
+        "media_info": [{"parts": [{"file": "/mnt/media/Movies/Cats.mkv"}]}],
+    }
+    media = Media(title="Cats")
+
+    assert screen_metadata(media, metadata)
+    assert media.tmdb_id == 269149
+    assert media.rating == 4.1
+    assert media.audience_rating == 5.0
+    assert media.file_path == "/mnt/media/Movies/Cats.mkv"
+    assert not screen_metadata(Media(title="Cats"), {**metadata, "rating": ""})
+    assert not screen_metadata(Media(title="Cats"), {})
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.content = orjson.dumps(data)
+
+
+class FakeTautulliSession:
+    """Serve get_library_media_info pages out of a list of rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.offsets = []
+
+    def get(self, url, params):
+        offset = params["start"]
+        self.offsets.append(offset)
+        page = self.rows[offset : offset + params["length"]]
+        return FakeResponse({"response": {"data": {"data": page}}})
+
+
+def test_get_media_info():
+    """Test that get_media_info yields every row and stops after a short page."""
+    rows = [{"rating_key": str(rating_key)} for rating_key in range(120)]
+    session = FakeTautulliSession(rows)
+
+    media_info = list(get_media_info(session, "tautulli", "1", limit=50))
+
+    assert media_info == rows
+    assert session.offsets == [0, 50, 100]
+
+
+class FakeMetadataSession:
+    """Serve get_metadata from the example metadata response."""
+
+    def get(self, url, params):
+        with open("metadata_example.json", "rb") as metadata_file:
+            metadata = orjson.loads(metadata_file.read())
+        return FakeResponse({"response": {"data": metadata}})
+
+
+def test_get_metadata():
+    """Test that get_metadata keeps only the fields screening uses."""
+    metadata = get_metadata(FakeMetadataSession(), "tautulli", "9660")
+
+    assert metadata.keys() == {"guids", "rating", "audience_rating", "media_info"}
+    assert metadata["rating"] == "9.8"
+    assert metadata["media_info"][0]["parts"][0]["file"].endswith(".mkv")
+
+
+def test_metadata_cache(tmp_path):
+    """Test that cached metadata is only returned while the item is unchanged."""
+    media_info = {
+        "rating_key": "9660",
+        "added_at": "1471813628",
+        "thumb": "/library/metadata/9660/thumb/1689479203",
+    }
+    updated_at = get_updated_at(media_info)
+    assert updated_at == 1689479203
+    metadata = {"rating": "9.8", "guids": ["tmdb://269149"]}
+    cache = open_metadata_cache(str(tmp_path / "metadata_cache.sqlite"))
+
+    assert get_cached_metadata(cache, "9660", updated_at) is None
+    cache_metadata(cache, "9660", updated_at, metadata)
+    assert get_cached_metadata(cache, "9660", updated_at) == metadata
+    assert get_cached_metadata(cache, "9660", updated_at + 1) is None
+
+
+class FailingDeleteHandler(BaseHTTPRequestHandler):
+    """Answer GETs with a canned library listing and every DELETE with a 500."""
+
+    listings = {
+        "/Request/movie": [{"theMovieDbId": 269149, "id": 12}],
+        "/movie": [{"tmdbId": 269149, "id": 7}],
+    }
+
+    def do_GET(self):
+        body = orjson.dumps(self.listings[self.path])
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        self.server.delete_count += 1
+        self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def failing_delete_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FailingDeleteHandler)
+    server.delete_count = 0
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_remove_from_ombi_delete_error(failing_delete_server, caplog):
+    """Test that a 5xx delete is reported once as an Ombi error instead of raising."""
+    ombi_url = f"http://127.0.0.1:{failing_delete_server.server_port}"
+    blacklist = [Media(title="Zootopia", tmdb_id=269149)]
+
+    with caplog.at_level(logging.ERROR):
+        remove_from_ombi(build_session(pool_size=1), ombi_url, blacklist)
+
+    assert "errors when trying to remove from Ombi: ['Zootopia']" in caplog.text
+    assert failing_delete_server.delete_count == 1
+
+
+def test_remove_from_radarr_delete_error(failing_delete_server, caplog):
+    """Test that a 5xx bulk delete is logged and the unknown movies still come back."""
+    radarr_url = f"http://127.0.0.1:{failing_delete_server.server_port}"
+    in_radarr = Media(title="Zootopia", tmdb_id=269149)
+    not_in_radarr = Media(title="Cats", tmdb_id=536869)
+
+    with caplog.at_level(logging.ERROR):
+        missing = remove_from_radarr(
+            build_session(pool_size=1), radarr_url, [in_radarr, not_in_radarr]
+        )
+
+    assert missing == [not_in_radarr]
+    assert in_radarr.radarr_id == 7
+    assert "Error deleting from Radarr" in caplog.text
+    assert failing_delete_server.delete_count == 1